@@ -2,40 +2,158 @@
 This module contains the core Agent class, which orchestrates the web
 scraping process by implementing the OODA (Observe, Orient, Decide, Act) loop.
 """
-import json
-from typing import List, Dict, Any
+import asyncio
+import os
+import re
+from collections import deque
+from datetime import datetime
+from urllib.parse import urlparse
+from typing import List, Dict, Any, Deque, Optional, Set, Tuple
+
+import aiofiles
+import httpx
+import orjson
 from selenium.webdriver.remote.webdriver import WebDriver
-from bs4 import BeautifulSoup
-from pydantic_ai import Agent as PydanticAIAgent
+from bs4 import BeautifulSoup, SoupStrainer, Tag, NavigableString
+from pydantic import BaseModel, Field, TypeAdapter
+from pydantic_ai import Agent as PydanticAIAgent, NativeOutput
+from pydantic_ai.messages import TextPart
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
-from src.toolbox import Action, Finish, ExtractData, Navigate
+from src.toolbox import Action, Decision, Finish, ExtractData, Navigate
 from src.executor import ActionExecutor
+from src.llm_cache import ResponseCache, PromptCache
+
+# Only the <body> subtree is parsed; <head> (scripts, styles, meta, links) is
+# skipped by the parser instead of being built and then thrown away.
+_BODY_STRAINER = SoupStrainer('body')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Subtrees skipped entirely when simplifying a page.
+_STRIP_TAGS = frozenset({'script', 'style', 'svg', 'nav', 'footer', 'header', 'noscript'})
+# Frames are written as their source URL; their own contents are never loaded.
+_FRAME_TAGS = frozenset({'frame', 'iframe'})
+# Elements that get their own line in the simplified page, see Agent._clean_html.
+_ELEMENT_TAGS = frozenset({'a', 'button', 'input', 'select', 'option', 'textarea', 'td', 'th', 'li', 'h1', 'h2', 'h3'})
+_SELECTOR_ATTRS = ('name', 'type', 'value')
+# Elements whose own text identifies them, written even inside a described table cell or list item.
+_LABELLED_TAGS = frozenset({'a', 'button', 'option'})
+# Layout/utility classes that tell the LLM nothing about what an element is.
+_NOISE_CLASS_RE = re.compile(r'^(col|row|d|m[trblxy]?|p[trblxy]?|text|align|float|ng|js|fa|visible|hidden)(-|$)|^(clearfix|container|wrapper)$')
+_MAX_TEXT_CHARS = 200
+_MAX_PAGE_CHARS = 8000
+# Only the most recent summarized steps are kept, so the prompt stays bounded.
+_MAX_SUMMARY_LINES = 20
+# Pages with at least this many non-empty table cells (five rows of two
+# columns) are treated as likely listings, and extraction is started alongside
+# the decision instead of after it. Layout tables rarely have that many.
+_TABLE_CELL_LINE_RE = re.compile(r'^td\b[^"\n]*"', re.MULTILINE)
+_SPECULATIVE_EXTRACTION_MIN_CELLS = 10
+# Signals used to decide some pages without asking the LLM, see Agent._classify_page.
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+# A title only counts as an error page when it consists of a status code and/or
+# an error phrase, so titles like "Top 500 Companies" or "Error Codes Registry" don't.
+_ERROR_PHRASES = (
+    r'(?:page not found|not found|file or directory not found|the page cannot be found|access denied|'
+    r'forbidden|unauthorized|bad request|service unavailable|bad gateway|internal server error|'
+    r'server error|runtime error)'
+)
+_ERROR_TITLE_RE = re.compile(
+    rf'^\s*(?:(?:http\s*)?(?:error\s*)?[45]\d\d\b[\s:.\-]*{_ERROR_PHRASES}?|{_ERROR_PHRASES}|server error in \S.*)\s*[.!]?\s*$',
+    re.IGNORECASE,
+)
+_INTERACTIVE_LINE_RE = re.compile(r'^(a|button|input|select|textarea|frame|iframe)\b', re.MULTILINE)
+_MIN_CONTENT_CHARS = 500
+
+def _is_line_element(tag: Tag) -> bool:
+    """True for elements that `Agent._clean_html` writes as their own line."""
+    return tag.name in _ELEMENT_TAGS or tag.name in _FRAME_TAGS
+
+def _line_element_ancestors(soup: BeautifulSoup) -> Set[int]:
+    """
+    Returns the ids of all elements with a line element somewhere below them.
+
+    Each ancestor chain is climbed only until it meets an element that is
+    already marked, so the whole pass is linear in the size of the page.
+    """
+    marked: Set[int] = set()
+    for tag in soup.find_all(_is_line_element):
+        for parent in tag.parents:
+            if id(parent) in marked:
+                break
+            marked.add(id(parent))
+    return marked
+
+def _first_json_object(text: str) -> Optional[str]:
+    """Returns the first complete top-level JSON object in `text`, or None if none has closed yet."""
+    depth = 0
+    start = None
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
 
 # --- Pydantic models for data extraction ---
-from pydantic import BaseModel, Field
-from typing import List
-import os
-import asyncio
-from datetime import datetime
 
 class Company(BaseModel):
     """Pydantic model to structure the extracted company data."""
     company_name: str = Field(..., description="The full, official name of the company.")
     address: str = Field(..., description="The registered address of the company.")
-    registration_number: str = Field(None, description="The official registration number, if available.")
+    registration_number: Optional[str] = Field(None, description="The official registration number, if available.")
     other_details: Dict[str, Any] = Field({}, description="A dictionary for any other relevant details found.")
 
 class CompanyList(BaseModel):
     """A list of companies, used for validating the LLM's extraction output."""
     companies: List[Company]
 
+# Building a TypeAdapter compiles the validator and serializer for its type,
+# so these are built once at import rather than for every Agent.
+_DECISION_ADAPTER = TypeAdapter(Decision)
+_COMPANY_LIST_ADAPTER = TypeAdapter(CompanyList)
+
+_EXTRACTION_SYSTEM_PROMPT = (
+    "You are a data extraction specialist. You are given one or more web pages, each introduced by an "
+    "`=== PAGE k ===` line and written as one line per element (`tag#id.class[attr=\"value\"] \"text\" -> href`). "
+    "Extract all companies from all pages."
+)
+
+def create_http_client() -> httpx.AsyncClient:
+    """Returns a keep-alive HTTP/2 client for LLM calls; the caller closes it."""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+
+def create_llm(gemini_api_key: str, http_client: httpx.AsyncClient) -> GeminiModel:
+    """Returns the Gemini model used by the agents, sending its requests through `http_client`."""
+    return GeminiModel(
+        'gemini-1.5-flash',
+        provider=GoogleGLAProvider(api_key=gemini_api_key, http_client=http_client)
+    )
+
 class Agent:
     """
     The autonomous agent that navigates and scrapes websites.
     """
-    def __init__(self, driver: WebDriver, gemini_api_key: str, goal: str, target_url: str, max_steps: int = 20):
+    def __init__(self, driver: WebDriver, gemini_api_key: str, goal: str, target_url: str, max_steps: int = 20, history_window: int = 5, llm: Optional[GeminiModel] = None, extraction_batch_size: int = 4):
         """
         Initializes the Agent.
 
@@ -45,52 +163,207 @@ class Agent:
             goal: The high-level objective for the agent.
             target_url: The starting URL for the agent.
             max_steps: The maximum number of steps the agent can take to prevent infinite loops.
+            history_window: How many recent steps are sent to the LLM verbatim; older
+                steps are folded into a one-line-per-step summary of the latest
+                steps.
+            llm: A Gemini model to share between agents. One is created from the API key if omitted.
+            extraction_batch_size: How many pages marked for extraction are collected
+                before they are sent to the LLM together in one request.
         """
         self.driver = driver
         self.goal = goal
         self.target_url = target_url
         self.max_steps = max_steps
-        self.history: List[Dict[str, Any]] = []
+        self.history_recent: Deque[Dict[str, Any]] = deque(maxlen=history_window)
+        self.history_summary: Deque[str] = deque(maxlen=_MAX_SUMMARY_LINES)
+        self._step_timestamp = ""
+        # Names this agent's log files apart from those of agents running alongside it.
+        self._log_prefix = re.sub(r'[^\w.-]', '_', urlparse(target_url).netloc) or 'agent'
+        self.extraction_batch_size = extraction_batch_size
+        self._pending_extractions: List[str] = []
         self.action_executor = ActionExecutor(driver)
 
+        # Set by _enable_cdp at the start of the run.
+        self._cdp_enabled = False
+
         # Configure the PydanticAI client for decision making
-        llm = GeminiModel(
-            'gemini-1.5-flash',
-            provider=GoogleGLAProvider(api_key=gemini_api_key)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        if llm is None:
+            # Keep-alive HTTP/2 connection reused by every LLM call of this agent.
+            self._http_client = create_http_client()
+            llm = create_llm(gemini_api_key, self._http_client)
+        self.decision_client = PydanticAIAgent(
+            llm,
+            output_type=NativeOutput(Decision),
+            system_prompt=self._construct_decision_system_prompt(),
+        )
+        self.extraction_client = PydanticAIAgent(
+            llm,
+            output_type=NativeOutput(CompanyList),
+            system_prompt=_EXTRACTION_SYSTEM_PROMPT,
         )
-        self.decision_client = PydanticAIAgent(llm, result_type=Action)
-        self.extraction_client = PydanticAIAgent(llm, result_type=CompanyList)
+        self.model_name = llm.model_name
+        self.response_cache = ResponseCache(gemini_api_key)
+        self.prompt_cache = PromptCache()
 
 
+    def _enable_cdp(self):
+        """
+        Enables the CDP DOM domain on Chromium drivers, which can then read the
+        DOM without the serialization done for driver.page_source.
+        """
+        if not hasattr(self.driver, 'execute_cdp_cmd'):
+            return
+        try:
+            self.driver.execute_cdp_cmd('DOM.enable', {})
+            self._cdp_enabled = True
+        except Exception as e:
+            print(f"[AGENT] > CDP unavailable, using page_source: {e}")
+
+    def _get_page_source(self) -> str:
+        """Returns the current DOM as HTML, via CDP when available."""
+        if self._cdp_enabled:
+            try:
+                # Node ids are invalidated by navigation, so the document is re-fetched every time.
+                root = self.driver.execute_cdp_cmd('DOM.getDocument', {'depth': 0})
+                return self.driver.execute_cdp_cmd('DOM.getOuterHTML', {'nodeId': root['root']['nodeId']})['outerHTML']
+            except Exception as e:
+                print(f"[AGENT] > CDP DOM read failed, using page_source: {e}")
+        return self.driver.page_source
+
+    @staticmethod
+    def _describe_element(tag: Tag, with_text: bool) -> str:
+        """Formats an element as one compact line, e.g. `a#login.btn "Login" -> /login`."""
+        line = tag.name
+        if tag.get('id'):
+            line += f"#{tag['id']}"
+        line += ''.join(f".{c}" for c in tag.get('class', []) if not _NOISE_CLASS_RE.match(c))
+        for attr in _SELECTOR_ATTRS:
+            if tag.get(attr):
+                line += f'[{attr}="{tag[attr][:_MAX_TEXT_CHARS]}"]'
+        if with_text:
+            text = _WHITESPACE_RE.sub(' ', tag.get_text(' ', strip=True))[:_MAX_TEXT_CHARS]
+            if text:
+                line += f' "{text}"'
+        if tag.get('href'):
+            line += f" -> {tag['href']}"
+        if 'doPostBack' in tag.get('onclick', ''):
+            line += f" onclick: {tag['onclick']}"
+        return line
+
     def _clean_html(self, page_source: str) -> str:
-        """Removes unnecessary tags to simplify HTML and reduce token count."""
-        soup = BeautifulSoup(page_source, 'html.parser')
-        for tag in soup(['script', 'style', 'svg', 'nav', 'footer', 'header']):
+        """
+        Reduces the page to one line per meaningful element to cut token count.
+
+        Links, form controls, table cells, list items and headings are written
+        as `tag#id.class[attr="value"] "text" -> href`, and frames as
+        `frame -> src`. Other text is kept as bare quoted lines in document
+        order; a block with no such elements inside becomes a single line.
+        Attributes without meaning to the LLM are dropped.
+        """
+        soup = BeautifulSoup(page_source, 'lxml', parse_only=_BODY_STRAINER)
+        if not soup.contents:
+            # Pages without a <body> (e.g. framesets) need a full parse.
+            soup = BeautifulSoup(page_source, 'lxml')
+
+        # Removed up front so that get_text() on an enclosing element does not
+        # pick up their text either.
+        for tag in soup.find_all(list(_STRIP_TAGS)):
             tag.decompose()
-        return str(soup.prettify())[:8000]
 
-    def _construct_decision_prompt(self, simplified_html: str) -> str:
-        """Constructs the prompt for the LLM to decide the next action."""
+        has_line_below = _line_element_ancestors(soup)
+        lines = []
+        length = 0
+        # Iterative depth-first walk; the flag marks subtrees whose text has
+        # already been written as part of an enclosing element's line.
+        stack = [(soup, False)]
+        while stack and length < _MAX_PAGE_CHARS:
+            node, text_written = stack.pop()
+            line = None
+            if isinstance(node, NavigableString):
+                text = _WHITESPACE_RE.sub(' ', node).strip()
+                if text:
+                    line = f'"{text[:_MAX_TEXT_CHARS]}"'
+            elif node.name in _FRAME_TAGS:
+                if node.get('src'):
+                    line = f"{node.name} -> {node['src']}"
+            elif node.name == 'input' and node.get('type', '').lower() == 'hidden':
+                # Hidden fields such as ASP.NET's __VIEWSTATE can be many KB
+                # and are never acted on directly.
+                pass
+            elif node.name in _ELEMENT_TAGS:
+                with_text = node.name != 'select' and (not text_written or node.name in _LABELLED_TAGS)
+                line = self._describe_element(node, with_text)
+                if line == node.name:
+                    # Nothing beyond the tag name, e.g. an empty nested <li>.
+                    line = None
+                text_written = text_written or with_text
+            elif not text_written and id(node) not in has_line_below:
+                # A plain text block, e.g. <p><b>Name</b><br>Address</p>, stays
+                # on one line so its parts keep their order.
+                text = _WHITESPACE_RE.sub(' ', node.get_text(' ', strip=True))
+                if text:
+                    line = f'"{text[:_MAX_TEXT_CHARS]}"'
+                text_written = True
+            if line:
+                lines.append(line)
+                length += len(line) + 1
+            if isinstance(node, NavigableString) or node.name in _FRAME_TAGS:
+                continue
+            # Text nodes are pushed alongside elements so mixed content is
+            # written in document order.
+            stack.extend(
+                (child, text_written) for child in reversed(node.contents)
+                if (type(child) is NavigableString and not text_written) or isinstance(child, Tag)
+            )
+        return '\n'.join(lines)[:_MAX_PAGE_CHARS]
+
+    def _construct_decision_system_prompt(self) -> str:
+        """
+        Constructs the static part of the decision prompt.
+
+        It is sent as the system instruction so it forms an identical prefix on
+        every step, which Gemini can serve from its prompt cache.
+        """
         return f"""
 You are an autonomous web scraping agent. Your primary goal is: "{self.goal}".
 You operate in a step-by-step manner. Based on the current state of the website and your history, you must decide on the single best action to take RIGHT NOW to move closer to the goal.
+The current page is given as one line per element in the form `tag#id.class[attr="value"] "text" -> href`, which you can use to build CSS selectors.
+"""
 
-**History of Actions Taken & Results:**
-{json.dumps(self.history, indent=2)}
+    def _construct_decision_prompt(self, simplified_html: str) -> str:
+        """
+        Constructs the per-step part of the decision prompt.
 
-**Current Page HTML (simplified):**
-```html
+        Sections are ordered from least to most volatile (summary, recent
+        history, page HTML) so consecutive prompts share as long a prefix as
+        possible.
+        """
+        return f"""
+**Summary of Earlier Actions:**
+{"".join(self.history_summary) or "None."}
+
+**Recent Actions Taken & Results:**
+{orjson.dumps(list(self.history_recent), option=orjson.OPT_INDENT_2).decode()}
+
+**Current Page Elements (simplified):**
+```
 {simplified_html}
 ```
 """
 
-    def _construct_extraction_prompt(self, simplified_html: str) -> str:
-        """Constructs the prompt for extracting structured data from a page."""
+    def _construct_extraction_prompt(self, pages: List[str]) -> str:
+        """
+        Constructs the prompt for extracting structured data from a batch of pages.
+
+        The instructions live in the extraction client's system prompt, so
+        only the pages themselves are sent here.
+        """
+        body = "\n".join(f"=== PAGE {k} ===\n{page}" for k, page in enumerate(pages, start=1))
         return f"""
-You are a data extraction specialist. From the following HTML, extract all companies.
-Here is the HTML:
-```html
-{simplified_html}
+Here are the page elements:
+```
+{body}
 ```
 """
     def _get_action_description(self, action: Action) -> str:
@@ -103,75 +376,266 @@ Here is the HTML:
             return action.reason
         return "No description available."
 
+    async def _write_log(self, direction: str, name: str, content: str):
+        """
+        Writes a prompt or response to logs/<direction>/ without blocking the event loop.
+
+        File names start with the target host, and all files of one step share
+        the timestamp taken at the start of that step.
+        """
+        filename = f"logs/{direction}/{self._log_prefix}_{self._step_timestamp}_{name}.txt"
+        async with aiofiles.open(filename, 'w', encoding='utf-8') as f:
+            await f.write(content)
+
+    async def _run_cached(self, client: PydanticAIAgent, adapter: TypeAdapter, prompt: str, log_name: str, stream: bool = False) -> Any:
+        """
+        Sends a prompt to the LLM unless its response is in the persistent cache.
+
+        The goal is part of the cache key because it is baked into the
+        decision client's system prompt.
+
+        Args:
+            client: The PydanticAI agent to query on a cache miss.
+            adapter: Adapter for the client's output type, used to (de)serialize cached responses.
+            prompt: The prompt to send.
+            log_name: Suffix for the log file of the received response.
+            stream: Stream the response and stop reading as soon as a complete
+                JSON object has arrived. Only for clients with NativeOutput.
+
+        Returns:
+            The validated output of the LLM.
+        """
+        key = PromptCache.make_key(self.model_name, self.goal + prompt)
+        cached = await asyncio.to_thread(self.prompt_cache.get, key)
+        if cached is not None:
+            print("[CACHE] > Found response from a previous run.")
+            # The received logs are the record of what was extracted, so a
+            # cached response is logged just like a fresh one.
+            await self._write_log('received', log_name, cached)
+            return adapter.validate_json(cached)
+
+        if stream:
+            output = await self._run_streamed(client, adapter, prompt, log_name)
+        else:
+            result = await client.run(prompt)
+            await self._write_log('received', log_name, str(result))
+            output = result.output
+        await asyncio.to_thread(self.prompt_cache.set, key, adapter.dump_json(output).decode('utf-8'))
+        return output
+
+    async def _run_streamed(self, client: PydanticAIAgent, adapter: TypeAdapter, prompt: str, log_name: str) -> Any:
+        """Streams a JSON response and validates it as soon as the top-level object closes."""
+        text = ""
+        json_text = None
+        async with client.run_stream(prompt) as result:
+            async for response, _ in result.stream_responses(debounce_by=None):
+                text = "".join(part.content for part in response.parts if isinstance(part, TextPart))
+                json_text = _first_json_object(text)
+                if json_text is not None:
+                    # Leaving the context manager closes the stream; the rest
+                    # of the response is never read.
+                    break
+        await self._write_log('received', log_name, text)
+        return adapter.validate_json(json_text or text)
+
+    def _record_history(self, entry: Dict[str, Any]):
+        """
+        Appends a step to the recent history, summarizing the step it evicts.
+
+        Keeping only a fixed window verbatim bounds the decision prompt size
+        instead of letting it grow with every step.
+        """
+        if len(self.history_recent) == self.history_recent.maxlen:
+            evicted = self.history_recent[0]
+            action = evicted["action"]
+            if isinstance(action, dict):
+                detail = action.get("description") or action.get("url")
+                action = f"{action['action_name']} ({detail})" if detail else action['action_name']
+            result = _WHITESPACE_RE.sub(' ', str(evicted["result"]))[:_MAX_TEXT_CHARS]
+            self.history_summary.append(f"- {action}: {result}\n")
+        self.history_recent.append(entry)
+
+    def _semantic_cache_key(self, simplified_html: str, previous_html: Optional[str], previous_failed: bool) -> Optional[str]:
+        """
+        Returns the text the decision cache compares semantically, or None to skip that tier.
+
+        Only the page and the last step matter for a replayed decision. After a
+        failed step, or a step that left the page unchanged (e.g. filling a
+        field), the LLM has to see the outcome, so nothing is replayed.
+        """
+        if previous_failed or simplified_html == previous_html:
+            return None
+        last_step = orjson.dumps(self.history_recent[-1]).decode() if self.history_recent else ""
+        return f"{last_step}\n{simplified_html}"
+
+    def _looks_extractable(self, simplified_html: str) -> bool:
+        """Cheaply guesses whether the simplified page holds a table of companies."""
+        return len(_TABLE_CELL_LINE_RE.findall(simplified_html)) >= _SPECULATIVE_EXTRACTION_MIN_CELLS
+
+    def _classify_page(self, page_source: str, simplified_html: str, current_url: str, last_good_url: Optional[str], step: int) -> Optional[Tuple[Action, str]]:
+        """
+        Decides obvious pages without an LLM call.
+
+        Error pages and pages with no links, controls or meaningful text send
+        the agent back to the last page the LLM acted on, or finish the run if
+        there is none. The empty-page rule never applies to the starting page,
+        which may still be a script-rendered shell.
+
+        Args:
+            page_source: The raw HTML of the current page.
+            simplified_html: The output of `_clean_html` for the same page.
+            current_url: The URL of the current page.
+            last_good_url: The most recent URL that was sent to the LLM.
+            step: The zero-based index of the current step.
+
+        Returns:
+            The action to take and why it was taken, for the history, or None
+            if the LLM should decide.
+        """
+        title_match = _TITLE_RE.search(page_source)
+        if title_match and _ERROR_TITLE_RE.search(title_match.group(1)):
+            problem = f"Error page '{_WHITESPACE_RE.sub(' ', title_match.group(1)).strip()}' at {current_url}"
+        elif step > 0 and not _INTERACTIVE_LINE_RE.search(simplified_html) and len(simplified_html) < _MIN_CONTENT_CHARS:
+            problem = f"Page at {current_url} has no links, forms or meaningful content"
+        else:
+            return None
+        if last_good_url:
+            return Navigate(url=last_good_url), f"{problem}; navigated back to {last_good_url}."
+        return Finish(reason=f"{problem}."), problem
+
+    async def _extract(self, pages: List[str], step: int) -> str:
+        """Queries the LLM for the companies on a batch of pages and returns a result message for the history."""
+        extraction_prompt = self._construct_extraction_prompt(pages)
+        await self._write_log('sent', f"extract_step{step+1}", extraction_prompt)
+        try:
+            extracted_data = await self._run_cached(
+                self.extraction_client, _COMPANY_LIST_ADAPTER, extraction_prompt, f"extract_step{step+1}"
+            )
+            print(f"[LLM]   > Extracted {len(extracted_data.companies)} companies from {len(pages)} page(s).")
+            return f"Successfully extracted {len(extracted_data.companies)} companies from {len(pages)} page(s)."
+        except Exception as e:
+            print(f"[AGENT] > Data extraction failed: {e}")
+            return f"Data extraction failed: {e}"
+
+    async def _flush_extractions(self, step: int):
+        """Extracts any pages still waiting for a full batch, e.g. when the run ends."""
+        if self._pending_extractions:
+            pages, self._pending_extractions = self._pending_extractions, []
+            print(f"[AGENT] > Extracting {len(pages)} pending page(s) before ending the run...")
+            await self._extract(pages, step)
+
     async def run(self):
         """Starts the main OODA loop of the agent."""
         print(f"[AGENT] > Starting run. Navigating to initial URL: {self.target_url}")
-        self.driver.get(self.target_url)
+        last_good_url = None
+        previous_html = None
+        previous_failed = False
+        try:
+            # Selenium calls block, so they run in a thread to let other agents
+            # sharing the event loop make progress meanwhile.
+            await asyncio.to_thread(self._enable_cdp)
+            await asyncio.to_thread(self.driver.get, self.target_url)
 
-        os.makedirs('logs/sent', exist_ok=True)
-        os.makedirs('logs/received', exist_ok=True)
+            os.makedirs('logs/sent', exist_ok=True)
+            os.makedirs('logs/received', exist_ok=True)
 
-        for step in range(self.max_steps):
-            print(f"--- Step {step + 1}/{self.max_steps} ---")
+            for step in range(self.max_steps):
+                print(f"--- Step {step + 1}/{self.max_steps} ---")
+                self._step_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
 
-            # 1. OBSERVE
-            print(f"[AGENT] > Observing page: {self.driver.current_url}")
-            page_source = self.driver.page_source
-            simplified_html = self._clean_html(page_source)
+                # 1. OBSERVE
+                current_url = await asyncio.to_thread(getattr, self.driver, 'current_url')
+                print(f"[AGENT] > Observing page: {current_url}")
+                page_source = await asyncio.to_thread(self._get_page_source)
+                # Parsing a large page takes long enough to stall the other agents.
+                simplified_html = await asyncio.to_thread(self._clean_html, page_source)
 
-            # 2. ORIENT & DECIDE
-            print("[AGENT] > Sending context to LLM for decision...")
-            decision_prompt = self._construct_decision_prompt(simplified_html)
+                # 2. ORIENT & DECIDE
+                extract_task = None
+                shortcut_reason = None
+                shortcut = self._classify_page(page_source, simplified_html, current_url, last_good_url, step)
+                if shortcut is not None:
+                    action, shortcut_reason = shortcut
+                    action_description = self._get_action_description(action)
+                    print(f"[AGENT] > Page decided without LLM: {action.action_name} - {action_description}")
+                else:
+                    last_good_url = current_url
+                    print("[AGENT] > Sending context to LLM for decision...")
+                    decision_prompt = self._construct_decision_prompt(simplified_html)
 
-            # Log sent message
-            sent_filename = f"logs/sent/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_step{step+1}.txt"
-            with open(sent_filename, 'w', encoding='utf-8') as f:
-                f.write(decision_prompt)
+                    await self._write_log('sent', f"step{step+1}", decision_prompt)
 
-            try:
-                result = await self.decision_client.run(decision_prompt)
-                action = result.output
-                # Log received message
-                received_filename = f"logs/received/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_step{step+1}.txt"
-                with open(received_filename, 'w', encoding='utf-8') as f:
-                    f.write(str(result))
-                action_description = self._get_action_description(action)
-                print(f"[LLM]   > Decided action: {action.action_name} - {action_description}")
+                    # When this page looks like a listing that would complete the
+                    # extraction batch, start that batch's extraction in parallel;
+                    # the result is discarded unless the LLM decides to extract.
+                    batch_complete = len(self._pending_extractions) + 1 >= self.extraction_batch_size
+                    if batch_complete and self._looks_extractable(simplified_html):
+                        print("[AGENT] > Page looks like a listing. Extracting speculatively...")
+                        extract_task = asyncio.create_task(
+                            self._extract(self._pending_extractions + [simplified_html], step)
+                        )
 
-            except Exception as e:
-                print(f"[AGENT] > Error processing LLM response: {e}. Attempting to recover.")
-                self.history.append({"action": "LLM_Error", "result": str(e)})
-                continue
+                    try:
+                        decision = await self.response_cache.fetch(
+                            decision_prompt,
+                            lambda prompt: self._run_cached(
+                                self.decision_client, _DECISION_ADAPTER, prompt, f"step{step+1}", stream=True
+                            ),
+                            semantic_key=self._semantic_cache_key(simplified_html, previous_html, previous_failed),
+                        )
+                        action = decision.action
+                        action_description = self._get_action_description(action)
+                        print(f"[LLM]   > Decided action: {action.action_name} - {action_description}")
 
-            # 3. ACT
-            if isinstance(action, Finish):
-                print(f"[AGENT] > Finishing run. Reason: {action.reason}")
-                break
+                    except Exception as e:
+                        print(f"[AGENT] > Error processing LLM response: {e}. Attempting to recover.")
+                        if extract_task:
+                            extract_task.cancel()
+                        self._record_history({"action": "LLM_Error", "result": str(e)})
+                        previous_html, previous_failed = simplified_html, True
+                        continue
 
-            if isinstance(action, ExtractData):
-                print("[AGENT] > Extraction action triggered. Querying LLM for data...")
-                extraction_prompt = self._construct_extraction_prompt(simplified_html)
-                # Log sent extraction prompt
-                sent_filename = f"logs/sent/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_extract_step{step+1}.txt"
-                with open(sent_filename, 'w', encoding='utf-8') as f:
-                    f.write(extraction_prompt)
-                try:
-                    extracted_data_result = await self.extraction_client.run(extraction_prompt)
-                    extracted_data = extracted_data_result.output
-                    # Log received extraction data
-                    received_filename = f"logs/received/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_extract_step{step+1}.txt"
-                    with open(received_filename, 'w', encoding='utf-8') as f:
-                        f.write(str(extracted_data_result))
-                    print(f"[LLM]   > Extracted {len(extracted_data.companies)} companies.")
-                    result = f"Successfully extracted {len(extracted_data.companies)} companies."
-                except Exception as e:
-                    print(f"[AGENT] > Data extraction failed: {e}")
-                    result = f"Data extraction failed: {e}"
-            else:
-                result = self.action_executor.execute(action)
+                    if extract_task and not isinstance(action, ExtractData):
+                        extract_task.cancel()
 
-            # 4. LOOP (Update history)
-            self.history.append({"action": action.model_dump(), "result": result})
+                # 3. ACT
+                if isinstance(action, Finish):
+                    await self._flush_extractions(step)
+                    print(f"[AGENT] > Finishing run. Reason: {action.reason}")
+                    break
 
-        else:
-            print("[AGENT] > Reached max steps. Ending run.")
\ No newline at end of file
+                if isinstance(action, ExtractData):
+                    self._pending_extractions.append(simplified_html)
+                    if len(self._pending_extractions) < self.extraction_batch_size:
+                        print("[AGENT] > Extraction action triggered. Page queued for batch extraction.")
+                        result = f"Page queued for extraction ({len(self._pending_extractions)}/{self.extraction_batch_size} pages pending)."
+                    else:
+                        pages, self._pending_extractions = self._pending_extractions, []
+                        if extract_task:
+                            print("[AGENT] > Extraction action triggered. Awaiting speculative extraction...")
+                            result = await extract_task
+                        else:
+                            print("[AGENT] > Extraction action triggered. Querying LLM for data...")
+                            result = await self._extract(pages, step)
+                    failed = result.startswith("Data extraction failed")
+                else:
+                    result = await asyncio.to_thread(self.action_executor.execute, action)
+                    failed = result != "Success"
+                if shortcut_reason is not None:
+                    # The history must show the LLM why its last action went
+                    # wrong, and the semantic cache must not replay that action.
+                    result = shortcut_reason if not failed else f"{shortcut_reason} {result}"
+                    failed = True
+                previous_html, previous_failed = simplified_html, failed
+
+                # 4. LOOP (Update history)
+                self._record_history({"action": action.model_dump(), "result": result})
+
+            else:
+                await self._flush_extractions(self.max_steps - 1)
+                print("[AGENT] > Reached max steps. Ending run.")
+        finally:
+            await asyncio.to_thread(self.prompt_cache.close)
+            # A shared llm's client belongs to the caller and is closed there.
+            if self._http_client is not None:
+                await self._http_client.aclose()
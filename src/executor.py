@@ -3,11 +3,13 @@ This module is the "hands" of the agent. It takes a structured Action
 object from the toolbox and executes it using a Selenium WebDriver.
 """
 
-import time
+from typing import Optional
 from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
+from selenium.common.exceptions import JavascriptException, NoSuchElementException, TimeoutException
 
 # Import the action definitions from our toolbox
 from src.toolbox import (
@@ -17,10 +19,21 @@ from src.toolbox import (
     FillField,
     SelectDropdown,
     PerformPostback,
-    ExtractData,
-    Finish
 )
 
+# The 'extract_data' and 'finish' actions don't manipulate the browser,
+# so they are handled by the agent loop directly.
+_NO_BROWSER_ACTIONS = frozenset({'extract_data', 'finish'})
+# Navigate already blocks until the new page has loaded and filling a field
+# never reloads the page, so neither waits for the page to change.
+_NO_RELOAD_ACTIONS = frozenset({'navigate', 'fill_field'})
+# True while an ASP.NET UpdatePanel partial postback is still in flight.
+_ASYNC_POSTBACK_JS = (
+    "return !!(window.Sys && Sys.WebForms && Sys.WebForms.PageRequestManager"
+    " && Sys.WebForms.PageRequestManager.getInstance().get_isInAsyncPostBack());"
+)
+_BODY_SIZE_JS = "return document.body ? document.body.innerHTML.length : -1;"
+
 class ActionExecutor:
     """
     Executes actions on a web page using Selenium.
@@ -33,13 +46,20 @@ class ActionExecutor:
             driver: The Selenium WebDriver to interact with the browser.
         """
         self.driver = driver
+        self._dispatch = {
+            'navigate': self._navigate,
+            'click': self._click,
+            'fill_field': self._fill_field,
+            'select_dropdown': self._select_dropdown,
+            'perform_postback': self._perform_postback,
+        }
 
     def execute(self, action: Action) -> str:
         """
         Executes a given action and returns a result message.
 
         This method acts as a dispatcher, calling the appropriate
-        private method based on the type of action.
+        private method based on the action's name.
 
         Args:
             action: The Pydantic action object to execute.
@@ -48,29 +68,26 @@ class ActionExecutor:
             A string describing the outcome of the action (e.g., "Success" or an error message).
         """
         action_type = action.action_name
-        print(f"[EXECUTOR] > Executing: {action.description}")
+        # Navigate and Finish carry no description field.
+        print(f"[EXECUTOR] > Executing: {getattr(action, 'description', action_type)}")
         
         try:
-            if isinstance(action, Navigate):
-                self._navigate(action)
-            elif isinstance(action, Click):
-                self._click(action)
-            elif isinstance(action, FillField):
-                self._fill_field(action)
-            elif isinstance(action, SelectDropdown):
-                self._select_dropdown(action)
-            elif isinstance(action, PerformPostback):
-                self._perform_postback(action)
-            # The 'ExtractData' and 'Finish' actions don't manipulate the browser,
-            # so they are handled by the agent loop directly. They are included
-            # here to show they are valid actions.
-            elif isinstance(action, (ExtractData, Finish)):
-                return f"Action '{action_type}' acknowledged. No browser interaction needed."
-            else:
+            handler = self._dispatch.get(action_type)
+            if handler is None:
+                if action_type in _NO_BROWSER_ACTIONS:
+                    return f"Action '{action_type}' acknowledged. No browser interaction needed."
                 raise ValueError(f"Unknown action type: {action_type}")
-            
-            # Give the page a moment to load/react after an action
-            time.sleep(2)
+
+            expects_reload = action_type not in _NO_RELOAD_ACTIONS
+            if expects_reload:
+                old_body = self._find_body()
+                old_size = self.driver.execute_script(_BODY_SIZE_JS)
+            handler(action)
+
+            # Wait for the page to react.
+            if expects_reload:
+                self._wait_for_page_change(old_body, old_size)
+            self._wait_for_ready_state()
             return "Success"
 
         except (NoSuchElementException, TimeoutException) as e:
@@ -82,6 +99,50 @@ class ActionExecutor:
             print(f"[EXECUTOR] > {error_message}")
             return error_message
 
+    def _find_body(self) -> Optional[WebElement]:
+        try:
+            return self.driver.find_element(By.TAG_NAME, 'body')
+        except NoSuchElementException:
+            return None
+
+    def _wait_for_page_change(self, old_body: Optional[WebElement], old_size: int, timeout: float = 5, poll: float = 0.25):
+        """
+        Waits until the action has visibly changed the page.
+
+        That is either the old <body> being detached (a full reload), or, with
+        no ASP.NET async postback in flight, the size of the <body> differing
+        from `old_size` and holding steady between two polls (an in-place
+        update). Actions that change nothing simply run into the timeout.
+        """
+        last_size = [None]
+
+        def changed(driver) -> bool:
+            if old_body is not None and EC.staleness_of(old_body)(driver):
+                return True
+            if driver.execute_script(_ASYNC_POSTBACK_JS):
+                last_size[0] = None
+                return False
+            size = driver.execute_script(_BODY_SIZE_JS)
+            settled = size != old_size and size == last_size[0]
+            last_size[0] = size
+            return settled
+
+        try:
+            WebDriverWait(
+                self.driver, timeout, poll_frequency=poll, ignored_exceptions=(JavascriptException,)
+            ).until(changed)
+        except TimeoutException:
+            pass
+
+    def _wait_for_ready_state(self, timeout: float = 10):
+        """Waits until the current document has finished loading."""
+        try:
+            WebDriverWait(self.driver, timeout).until(
+                lambda d: d.execute_script('return document.readyState') == 'complete'
+            )
+        except TimeoutException:
+            pass
+
     def _navigate(self, action: Navigate):
         self.driver.get(action.url)
 
@@ -0,0 +1,194 @@
+"""
+This module contains caches for LLM responses, so the agent does not pay a
+full Gemini round-trip for a decision it has effectively already made.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+import numpy as np
+import google.generativeai as genai
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class _CacheEntry(NamedTuple):
+    embedding: Optional[np.ndarray]
+    value: Any
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    An in-memory LRU cache of LLM outputs keyed by prompt.
+
+    Lookups go through two tiers: an exact match on the SHA-256 of the
+    normalized prompt, then a semantic match on the cosine similarity of
+    embeddings of a caller-chosen semantic key. The semantic tier catches
+    near-identical pages such as consecutive pages of a paginated directory
+    listing; it is skipped when no semantic key is given.
+    """
+    def __init__(
+        self,
+        gemini_api_key: str,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: int = 3600,
+        max_entries: int = 1000,
+        embedding_model: str = 'models/text-embedding-004',
+    ):
+        """
+        Initializes the cache.
+
+        Args:
+            gemini_api_key: Your Google Gemini API key, used for embeddings.
+            similarity_threshold: Minimum cosine similarity for a semantic hit.
+            ttl_seconds: How long an entry stays valid.
+            max_entries: Number of entries kept before the least recently used is evicted.
+            embedding_model: The Gemini model used to embed prompts.
+        """
+        genai.configure(api_key=gemini_api_key)
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embedding_model = embedding_model
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+
+    @staticmethod
+    def _normalize(prompt: str) -> str:
+        return _WHITESPACE_RE.sub(' ', prompt).strip()
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Returns the unit-length embedding of the text, or None if embedding fails."""
+        try:
+            response = genai.embed_content(model=self.embedding_model, content=text)
+        except Exception as e:
+            print(f"[CACHE] > Embedding failed, skipping semantic lookup: {e}")
+            return None
+        vector = np.asarray(response['embedding'], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _evict_expired(self, now: float):
+        for key in [k for k, entry in self._entries.items() if entry.expires_at <= now]:
+            del self._entries[key]
+
+    def _semantic_lookup(self, embedding: np.ndarray) -> Optional[Any]:
+        keys = [k for k, entry in self._entries.items() if entry.embedding is not None]
+        if not keys:
+            return None
+        matrix = np.vstack([self._entries[k].embedding for k in keys])
+        similarities = matrix @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]].value
+
+    async def fetch(
+        self,
+        prompt: str,
+        generate: Callable[[str], Awaitable[Any]],
+        semantic_key: Optional[str] = None,
+    ) -> Any:
+        """
+        Returns the cached output for a prompt, calling `generate` on a miss.
+
+        Args:
+            prompt: The prompt that would be sent to the LLM.
+            generate: Coroutine function that sends the prompt and returns the output.
+            semantic_key: The text compared for the semantic tier. It should hold
+                only what the answer depends on, so unrelated prompt changes do not
+                mask real ones. If None, only exact matches are served.
+
+        Returns:
+            The cached or freshly generated output.
+        """
+        now = time.time()
+        self._evict_expired(now)
+
+        normalized = self._normalize(prompt)
+        key = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            print("[CACHE] > Exact prompt match, reusing previous response.")
+            return self._entries[key].value
+
+        embedding = None
+        if semantic_key is not None:
+            embedding = await asyncio.to_thread(self._embed, self._normalize(semantic_key))
+        if embedding is not None:
+            value = self._semantic_lookup(embedding)
+            if value is not None:
+                print("[CACHE] > Similar prompt found, reusing previous response.")
+                return value
+
+        value = await generate(prompt)
+        self._entries[key] = _CacheEntry(embedding, value, now + self.ttl_seconds)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+
+class PromptCache:
+    """
+    A persistent exact-match cache of LLM responses, stored in SQLite.
+
+    Re-running the scraper on a site whose pages have not changed then
+    costs no LLM calls at all. Responses are stored zlib-compressed.
+
+    The methods block on disk I/O, so async callers should run them in a
+    thread; a lock serializes access to the shared connection.
+    """
+    def __init__(self, path: str = 'cache/llm_cache.sqlite3'):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            path: Location of the SQLite database file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response BLOB NOT NULL, created_at INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str) -> str:
+        """Returns the cache key for a prompt sent to the given model."""
+        return hashlib.sha256((model_name + prompt).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the stored response for a key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def set(self, key: str, response: str):
+        """Stores a response under a key, replacing any previous one."""
+        data = zlib.compress(response.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, data, int(time.time())),
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            self._conn.close()
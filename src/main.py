@@ -2,14 +2,18 @@
 This is the main entry point for the AI Web Scraper application.
 
 This script initializes all the necessary components, including the Selenium
-WebDriver, the configuration, and the Agent itself. It then starts the
-agent on a specified target URL.
+WebDriver, the configuration, and the Agent itself. It then runs one agent
+per target URL, several at a time, each with its own browser.
 """
 
 import os
+import asyncio
+from typing import List, Optional, Tuple
+import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
+from pydantic_ai.models.gemini import GeminiModel
 
 # It's good practice to manage API keys via environment variables or a config file.
 # For simplicity, we'll define it here for now.
@@ -23,57 +27,114 @@ except ImportError:
 if not GEMINI_API_KEY:
     raise ValueError("GEMINI_API_KEY not found. Please set it in config.py or as an environment variable.")
 
-from src.agent import Agent
+from src.agent import Agent, create_http_client, create_llm
 
-def main():
+# --- Configuration ---
+# The input sheet; target URLs are read from its first column.
+URLS_FILE = "urls.xlsx"
+# Used when the input sheet is missing.
+# DEFAULT_TARGET_URL = "https://www.sme.in/Home/Index.htm"
+DEFAULT_TARGET_URL = "https://egov.gidcgujarat.org/GIDC_PAYMENT/Index.aspx"
+
+# The high-level goal for the agent.
+GOAL = "Find the businesses or company directories on this website, navigate through it, and extract details of all companies listed, including their name, address, and any other available information."
+
+# Each agent drives its own browser, so this caps the number of Chrome instances.
+MAX_CONCURRENT_AGENTS = 8
+
+def load_targets(path: str = URLS_FILE) -> List[Tuple[str, str]]:
+    """
+    Reads the (url, goal) pairs to scrape from the input sheet.
+
+    Args:
+        path: The Excel file listing one target URL per row in its first column,
+            without a header row.
+
+    Returns:
+        The target URLs, each paired with the default goal.
+    """
+    if not os.path.exists(path):
+        print(f"[MAIN] > {path} not found. Using the default target URL.")
+        return [(DEFAULT_TARGET_URL, GOAL)]
+    urls = pd.read_excel(path, header=None).iloc[:, 0].dropna().astype(str).str.strip()
+    return [(url, GOAL) for url in urls if url]
+
+def create_driver(driver_path: str) -> webdriver.Chrome:
+    """Starts a headless Chrome instance."""
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(service=ChromeService(driver_path), options=options)
+
+async def run_one(url: str, goal: str, llm: GeminiModel, driver_path: str, semaphore: asyncio.Semaphore):
     """
-    The main function to set up and run the agent.
+    Runs a single agent against a single URL in its own browser.
+
+    Args:
+        url: The starting URL for the agent.
+        goal: The high-level objective for the agent.
+        llm: The Gemini model shared by all agents.
+        driver_path: Path to the chromedriver binary.
+        semaphore: Limits how many agents (and browsers) run at once.
     """
-    # --- Configuration ---
-    # The URL of the website the agent should start on.
-    # TODO: REPLACE WITH A REAL TARGET URL from your urls.xlsx file.
-    # target_url = "https://www.sme.in/Home/Index.htm" 
-    target_url = "https://egov.gidcgujarat.org/GIDC_PAYMENT/Index.aspx" 
+    async with semaphore:
+        # --- WebDriver Setup ---
+        print(f"[MAIN] > Setting up Selenium WebDriver for {url}...")
+        try:
+            driver = await asyncio.to_thread(create_driver, driver_path)
+        except Exception as e:
+            print(f"[MAIN] > Error setting up WebDriver for {url}: {e}")
+            return
 
-    # The high-level goal for the agent.
-    goal = "Find the businesses or company directories on this website, navigate through it, and extract details of all companies listed, including their name, address, and any other available information."
+        # --- Agent Initialization and Execution ---
+        try:
+            agent = Agent(
+                driver=driver,
+                gemini_api_key=GEMINI_API_KEY,
+                goal=goal,
+                target_url=url,
+                llm=llm,
+            )
+            await agent.run()
 
-    # --- WebDriver Setup ---
-    print("[MAIN] > Setting up Selenium WebDriver...")
+        except Exception as e:
+            print(f"[MAIN] > An error occurred during the agent's run on {url}: {e}")
+        finally:
+            # --- Cleanup ---
+            print(f"[MAIN] > Agent run on {url} finished. Closing WebDriver.")
+            await asyncio.to_thread(driver.quit)
+
+async def run_all(targets: List[Tuple[str, str]]):
+    """Runs one agent per (url, goal) pair, at most MAX_CONCURRENT_AGENTS at a time."""
     try:
-        # Using webdriver-manager to automatically handle the driver installation
-        options = webdriver.ChromeOptions()
-        # options.add_argument("--headless") # Run in headless mode (no GUI) for servers
-        options.add_argument("--start-maximized")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        
-        driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
-        print("[MAIN] > WebDriver setup complete.")
+        # Using webdriver-manager to automatically handle the driver installation.
+        # It is resolved once here rather than by every agent concurrently.
+        driver_path = ChromeDriverManager().install()
     except Exception as e:
-        print(f"[MAIN] > Error setting up WebDriver: {e}")
+        print(f"[MAIN] > Error installing ChromeDriver: {e}")
         return
 
-    # --- Agent Initialization and Execution ---
-    try:
-        # Initialize the agent, now passing the target_url
-        agent = Agent(
-            driver=driver, 
-            gemini_api_key=GEMINI_API_KEY, 
-            goal=goal,
-            target_url=target_url # <-- FIX: Pass the URL to the agent
-        )
-        
-        # Start the agent's run loop
-        import asyncio
-        asyncio.run(agent.run())
+    # One model is shared by all agents, and with it one HTTP/2 client, so
+    # every LLM call reuses the same pool of kept-alive, multiplexed connections.
+    async with create_http_client() as http_client:
+        llm = create_llm(GEMINI_API_KEY, http_client)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_AGENTS)
+        await asyncio.gather(*(run_one(url, goal, llm, driver_path, semaphore) for url, goal in targets))
 
-    except Exception as e:
-        print(f"[MAIN] > An error occurred during the agent's run: {e}")
-    finally:
-        # --- Cleanup ---
-        print("[MAIN] > Agent run finished. Closing WebDriver.")
-        driver.quit()
+def main(targets: Optional[List[Tuple[str, str]]] = None):
+    """
+    The main function to set up and run the agents.
+
+    Args:
+        targets: The (url, goal) pairs to scrape. Read from urls.xlsx if omitted.
+    """
+    if targets is None:
+        targets = load_targets()
+    print(f"[MAIN] > Running {len(targets)} agent(s), up to {MAX_CONCURRENT_AGENTS} at a time.")
+    asyncio.run(run_all(targets))
 
 if __name__ == "__main__":
     main()
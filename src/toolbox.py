@@ -77,4 +77,12 @@ Action = Union[
     PerformPostback,
     ExtractData,
     Finish
-]
\ No newline at end of file
+]
+
+
+class Decision(BaseModel):
+    """
+    The agent's choice for a single step. Wrapping the Action union in one
+    object lets the LLM answer with a single JSON object of a fixed schema.
+    """
+    action: Action